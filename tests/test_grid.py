@@ -0,0 +1,185 @@
+import unittest
+from hypothesis import given
+from hypothesis.strategies import integers, floats
+import tracemalloc
+import sys
+sys.path.append('..')
+import numpy as np
+from undulator.undulator import Undulator
+from undulator.grid import BrightnessWorkspace, lamda_n, energy_n, brightness
+
+
+class TestGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.insdev = {
+                'period': 18e-3,
+                'Kmax': 1.38,
+                'Np': 111,
+                'L': 18e-3*111
+                }
+        self.beam = {
+            'energy': 3e9,
+            'betax': 9,
+            'betay': 4.7,
+            'emitx': 350e-12,
+            'emity': 8e-12,
+            'espread': 0.8e-3
+        }
+        self.ID = Undulator(insdev=self.insdev, beam=self.beam)
+        self.n = np.arange(1, 51)[:, None, None, None]
+        self.K = np.linspace(0.2, 3, 8)[:, None, None]
+        self.betax = np.linspace(1, 12, 6)[:, None]
+        self.betay = np.linspace(1, 12, 5)
+        self.shape = (50, 8, 6, 5)
+
+    def scalar_ID(self, K, betax, betay):
+        insdev = dict(self.insdev, Kmax=K)
+        beam = dict(self.beam, betax=betax, betay=betay)
+        return Undulator(insdev=insdev, beam=beam)
+
+    @given(n=integers(min_value=1, max_value=50),
+            K=floats(min_value=0.1, max_value=10))
+    def test_lamda_n_matches_scalar(self, n, K):
+        ID = self.scalar_ID(K, self.beam['betax'], self.beam['betay'])
+        actual_value = lamda_n(self.ID, n, K)
+        self.assertAlmostEqual(actual_value/ID.lamda_n(n), 1)
+        actual_value = energy_n(self.ID, n, K)
+        self.assertAlmostEqual(actual_value/ID.energy_n(n), 1)
+
+    @given(n=integers(min_value=1, max_value=50),
+            theta=floats(min_value=0, max_value=1e-3))
+    def test_lamda_n_theta_matches_scalar(self, n, theta):
+        actual_value = lamda_n(self.ID, n, theta=theta)
+        self.assertAlmostEqual(actual_value/self.ID.lamda_n(n, theta), 1)
+
+    def test_brightness_matches_scalar(self):
+        B = brightness(self.ID, self.n, self.K, self.betax, self.betay)
+        self.assertEqual(B.shape, self.shape)
+        for index in [(0, 0, 0, 0), (2, 7, 5, 4), (49, 3, 1, 2)]:
+            i, j, k, l = index
+            ID = self.scalar_ID(self.K[j, 0, 0], self.betax[k, 0],
+                    self.betay[l])
+            self.assertAlmostEqual(B[index]/ID.brightness(i+1), 1)
+
+    @given(n=integers(min_value=1, max_value=50),
+            K=floats(min_value=0.01, max_value=10),
+            betax=floats(min_value=0.1, max_value=100),
+            betay=floats(min_value=0.1, max_value=100))
+    def test_brightness_matches_scalar_everywhere(self, n, K, betax, betay):
+        '''
+        The grid and scalar implementations must not drift apart
+        '''
+        ID = self.scalar_ID(K, betax, betay)
+        actual_value = brightness(self.ID, n, K, betax, betay)
+        self.assertAlmostEqual(actual_value/ID.brightness(n), 1)
+
+    def test_brightness_defaults_to_ID(self):
+        self.assertAlmostEqual(brightness(self.ID)/self.ID.brightness(), 1)
+
+    def test_float32_wavelength_error_bounds(self):
+        '''
+        float32 lamda_n and energy_n stay within the bounds in the docs
+        over the full range of n, K and theta
+        '''
+        n = np.arange(1, 51)[:, None, None]
+        K = np.geomspace(0.01, 10, 400)[:, None]
+        theta = np.concatenate([[0], np.geomspace(1e-7, 1e-3, 40)])
+        for func, bound in ((lamda_n, 9 * 2**-24), (energy_n, 12 * 2**-24)):
+            val64 = func(self.ID, n, K, theta)
+            val32 = func(self.ID, n, K, theta, dtype=np.float32)
+            self.assertEqual(val32.dtype, np.float32)
+            self.assertLess(np.max(np.abs(val32/val64 - 1)), bound)
+
+    def test_float32_brightness_error_bounds(self):
+        '''
+        float32 brightness stays within 60u * lambda_n/(lambda_n - width),
+        and so within 4e-6 while the width is below lambda_n/10
+        '''
+        n = np.arange(1, 51)[:, None, None, None]
+        K = np.geomspace(0.01, 10, 12)[:, None, None]
+        betax = np.geomspace(0.1, 100, 6)[:, None]
+        betay = np.geomspace(0.1, 100, 6)
+        beams = (self.beam,
+                dict(self.beam, emity=1e-9, espread=1e-2),
+                dict(self.beam, energy=8e9, emitx=1e-12, emity=1e-13))
+        for beam in beams:
+            ID = Undulator(insdev=self.insdev, beam=beam)
+            B64 = brightness(ID, n, K, betax, betay)
+            B32 = brightness(ID, n, K, betax, betay, dtype=np.float32)
+            error = np.abs(B32/B64 - 1)
+            width = np.empty((50, 12, 1, 6))
+            for index in np.ndindex(*width.shape):
+                i, j, _, l = index
+                scalar = self.scalar_ID(K[j, 0, 0], 1, betay[l])
+                scalar.beam.update(beam, betay=betay[l])
+                width[index] = (scalar.spectralwidth_total(i+1) /
+                        scalar.lamda_n(i+1))
+            amplification = np.broadcast_to(1 / (1 - width), error.shape)
+            self.assertTrue(np.all(error < 60 * 2**-24 * amplification))
+            physical = np.broadcast_to(width < 0.1, error.shape)
+            self.assertLess(np.max(error[physical]), 4e-6)
+
+    def test_out_and_workspace_are_reused(self):
+        out = np.empty(self.shape)
+        ws = BrightnessWorkspace(self.shape)
+        args = (self.ID, self.n, self.K, self.betax, self.betay)
+        result = brightness(*args, out=out, workspace=ws)
+        self.assertIs(result, out)
+        expected_value = brightness(*args)
+        np.testing.assert_allclose(out, expected_value, rtol=1e-14)
+
+    def test_repeated_evaluation_does_not_allocate(self):
+        '''
+        Once out and workspace exist, no grid-sized arrays are allocated
+        '''
+        K = np.linspace(0.2, 3, 40)[:, None, None]
+        betax = np.linspace(1, 12, 20)[:, None]
+        betay = np.linspace(1, 12, 20)
+        shape = (50, 40, 20, 20)
+        out = np.empty(shape)
+        ws = BrightnessWorkspace(shape)
+        args = (self.ID, self.n, K, betax, betay)
+        brightness(*args, out=out, workspace=ws)
+        tracemalloc.start()
+        brightness(*args, out=out, workspace=ws)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(peak, out.nbytes / 10)
+
+    def test_mismatched_buffers(self):
+        args = (self.ID, self.n, self.K, self.betax, self.betay)
+        with self.assertRaises(ValueError):
+            brightness(*args, out=np.empty(self.shape, np.float32))
+        with self.assertRaises(ValueError):
+            brightness(*args, workspace=BrightnessWorkspace((50, 8)))
+        with self.assertRaises(ValueError):
+            lamda_n(self.ID, self.n, out=np.empty((49, 1, 1, 1)))
+
+    def test_bad_dtype(self):
+        with self.assertRaises(ValueError):
+            lamda_n(self.ID, dtype=np.int64)
+
+    def test_bad_harmonics(self):
+        for n in (0, 51, [1, 2, 51]):
+            with self.assertRaises(ValueError):
+                brightness(self.ID, n)
+
+    def test_bad_beta(self):
+        '''
+        Negative or zero beta functions are an error, as in the scalar path
+        '''
+        for beta in (-1, 0, [-1, 0, 2], [2, 0]):
+            with self.assertRaises(ValueError):
+                brightness(self.ID, 1, 1.0, beta, 4.7)
+            with self.assertRaises(ValueError):
+                brightness(self.ID, 1, 1.0, 9, beta)
+
+    def test_bad_emittance(self):
+        ID = Undulator(insdev=self.insdev, beam=dict(self.beam, emitx=-1e-9))
+        with self.assertRaises(ValueError):
+            brightness(ID)
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import subprocess
+import sys
+sys.path.append('..')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The core import measured 0.011-0.016 s on a development machine.  The
+# budget allows roughly three times the fastest of those; the test compares
+# it against the fastest of several runs, so one slow sample on a loaded
+# machine does not fail it.  Heavy dependencies are caught by
+# test_core_import_loads_only_core, not by this timing.
+IMPORT_BUDGET = 0.04
+IMPORT_RUNS = 5
+
+CORE_MODULES = {
+        'undulator',
+        'undulator.undulator',
+        'undulator.ebeam',
+        'undulator.utilities',
+        }
+
+
+def run_isolated(code):
+    '''
+    Run code in a fresh interpreter so that nothing is already imported
+    '''
+    output = subprocess.check_output(
+            [sys.executable, '-c', code],
+            cwd=ROOT,
+            universal_newlines=True,
+            )
+    return output.strip()
+
+
+class TestPackageImport(unittest.TestCase):
+
+    def test_core_import_loads_only_core(self):
+        '''
+        `from undulator import Undulator` must not pull in heavy subsystems
+        '''
+        loaded = run_isolated(
+                'import sys\n'
+                'from undulator import Undulator\n'
+                'print(" ".join(m for m in sys.modules'
+                ' if m.split(".")[0] in ("undulator", "numpy")))'
+                )
+        self.assertEqual(set(loaded.split()), CORE_MODULES)
+
+    def test_core_import_time(self):
+        '''
+        Startup cost of the scalar core stays within the budget
+        '''
+        elapsed = [float(run_isolated(
+                'import time\n'
+                't0 = time.perf_counter()\n'
+                'from undulator import Undulator\n'
+                'print(time.perf_counter() - t0)'
+                )) for _ in range(IMPORT_RUNS)]
+        self.assertLess(min(elapsed), IMPORT_BUDGET)
+
+    def test_lazy_attributes(self):
+        '''
+        Heavy subsystems load on first attribute access
+        '''
+        loaded = run_isolated(
+                'import sys\n'
+                'import undulator\n'
+                'before = "undulator.grid" in sys.modules\n'
+                'undulator.BrightnessWorkspace\n'
+                'print(before, undulator.grid.__name__)'
+                )
+        self.assertEqual(loaded, 'False undulator.grid')
+
+    def test_unknown_attribute(self):
+        import undulator
+        with self.assertRaises(AttributeError):
+            undulator.no_such_attribute
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+import unittest
+from hypothesis import given
+from hypothesis.strategies import integers, floats
+import tracemalloc
+import sys
+sys.path.append('..')
+import numpy as np
+from undulator.undulator import Undulator
+from undulator.polarization import (POLARIZATIONS, StokesWorkspace,
+        bessel_j, polarized_flux, stokes)
+
+
+class TestBesselFunction(unittest.TestCase):
+
+    def test_known_values(self):
+        self.assertAlmostEqual(bessel_j(0, 1.0), 0.7651976865579666)
+        self.assertAlmostEqual(bessel_j(1, 1.0), 0.4400505857449335)
+        self.assertAlmostEqual(bessel_j(0, 0.0), 1.0)
+        self.assertAlmostEqual(bessel_j(3, 0.0), 0.0)
+
+    @given(m=integers(min_value=1, max_value=24),
+            z=floats(min_value=-25, max_value=25))
+    def test_recurrence(self, m, z):
+        '''
+        J_(m-1)(z) + J_(m+1)(z) = (2m/z) J_m(z)
+        '''
+        J = bessel_j([m-1, m, m+1], z)
+        self.assertAlmostEqual(z * (J[0] + J[2]), 2 * m * J[1])
+
+    def test_outside_supported_range(self):
+        for m, z in ((26, 1.0), (-1, 1.0), (1.5, 1.0), (3, 200.0), (3, -26)):
+            with self.assertRaises(ValueError):
+                bessel_j(m, z)
+
+
+class TestStokes(unittest.TestCase):
+
+    def setUp(self):
+        self.insdev = {
+                'period': 56e-3,
+                'Kmax': 3.6,
+                'Np': 46,
+                'L': 56e-3*46
+                }
+        self.beam = {
+            'energy': 1.5e9,
+            'betax': 6,
+            'betay': 3,
+            'emitx': 6e-9,
+            'emity': 60e-12,
+            'espread': 0.7e-3
+        }
+        self.ID = Undulator(insdev=self.insdev, beam=self.beam)
+        self.flux = 1.7443e14 * 1.5**2 * 46**2
+
+    def test_planar_limit(self):
+        '''
+        Ky=0 is a planar device: F_1 for K=1 is 0.368, linear horizontal
+        '''
+        S = stokes(self.ID, n=1, Kx=2**-0.5)
+        self.assertAlmostEqual(S[0] / self.flux, 0.368, places=3)
+        self.assertAlmostEqual(S[1] / S[0], 1)
+        self.assertEqual(S[2], 0)
+        self.assertAlmostEqual(S[3] / S[0], 0)
+
+    def test_vertical_planar(self):
+        S = stokes(self.ID, n=[1, 3, 5], Kx=0, Ky=1.5)
+        np.testing.assert_allclose(S[1], -S[0])
+        np.testing.assert_allclose(S[0], stokes(self.ID, [1, 3, 5], 1.5)[0])
+
+    def test_helical(self):
+        '''
+        Kx=Ky radiates only the fundamental on axis, circularly polarized
+        '''
+        S = stokes(self.ID, n=np.arange(1, 8), Kx=2.0, Ky=[[2.0], [-2.0]])
+        np.testing.assert_allclose(S[3, 0, 0], S[0, 0, 0])
+        np.testing.assert_allclose(S[3, 1, 0], -S[0, 1, 0])
+        np.testing.assert_allclose(S[1, :, 0], 0, atol=1e-12*S[0, 0, 0])
+        np.testing.assert_allclose(S[0, :, 1:], 0, atol=1e-12*S[0, 0, 0])
+
+    def test_even_harmonics_vanish(self):
+        S = stokes(self.ID, n=[2, 4, 50], Kx=[[1.0], [2.5]], Ky=0.7)
+        np.testing.assert_array_equal(S, 0)
+
+    @given(n=integers(min_value=1, max_value=49).map(lambda n: n | 1),
+            Kx=floats(min_value=0, max_value=5),
+            Ky=floats(min_value=-5, max_value=5))
+    def test_fully_polarized(self, n, Kx, Ky):
+        S = stokes(self.ID, n, Kx, Ky)
+        self.assertAlmostEqual(
+                (S[1]**2 + S[2]**2 + S[3]**2)**0.5 / self.flux,
+                S[0] / self.flux)
+
+    def test_energy_grid(self):
+        '''
+        Peak at the harmonic energy, zero one line width away
+        '''
+        ID = Undulator(dict(self.insdev, Kmax=1.2), self.beam)
+        energy = ID.energy_n(3)
+        width = energy / (3 * self.insdev['Np'])
+        energies = np.array([energy, energy + width, energy - width])
+        S = stokes(ID, n=[[1], [3]], Kx=1.2, energy=energies)
+        self.assertEqual(S.shape, (4, 2, 3))
+        np.testing.assert_allclose(S[:, 1, 0], stokes(ID, 3, 1.2))
+        np.testing.assert_allclose(S[:, 1, 1:], 0, atol=1e-6*S[0, 1, 0])
+        self.assertLess(S[0, 0, 0], 1e-3 * S[0, 1, 0])
+
+    def test_current_and_out(self):
+        out = np.empty((4, 3), np.float32)
+        S = stokes(self.ID, n=[1, 3, 5], Kx=1.0, Ky=0.5, current=0.5,
+                out=out, dtype=np.float32)
+        self.assertIs(S, out)
+        expected_value = 0.5 * stokes(self.ID, n=[1, 3, 5], Kx=1.0, Ky=0.5)
+        np.testing.assert_allclose(S, expected_value, rtol=1e-5)
+
+    def test_workspace_is_reused(self):
+        n = np.arange(1, 50, 2)[:, None, None]
+        Kx = np.linspace(0, 3, 6)[:, None]
+        Ky = np.linspace(-3, 3, 7)
+        energy = np.linspace(100, 2000, 5)[:, None, None, None]
+        ws = StokesWorkspace((25, 6, 7))
+        out = np.empty((4, 5, 25, 6, 7))
+        S = stokes(self.ID, n, Kx, Ky, energy, out=out, workspace=ws)
+        self.assertIs(S, out)
+        np.testing.assert_allclose(S, stokes(self.ID, n, Kx, Ky, energy))
+        S = stokes(self.ID, n, Kx, Ky, out=out[:, 0], workspace=ws)
+        np.testing.assert_allclose(S, stokes(self.ID, n, Kx, Ky))
+
+    def test_repeated_evaluation_does_not_allocate(self):
+        '''
+        Once out and workspace exist, no grid-sized arrays are allocated
+        '''
+        n = np.arange(1, 50, 2)[:, None, None]
+        Kx = np.linspace(0, 3, 60)[:, None]
+        Ky = np.linspace(-3, 3, 60)
+        energy = np.linspace(100, 2000, 4)[:, None, None, None]
+        ws = StokesWorkspace((25, 60, 60))
+        for shape, args in (((4, 25, 60, 60), (n, Kx, Ky)),
+                ((4, 4, 25, 60, 60), (n, Kx, Ky, energy))):
+            out = np.empty(shape)
+            stokes(self.ID, *args, out=out, workspace=ws)
+            tracemalloc.start()
+            stokes(self.ID, *args, out=out, workspace=ws)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.assertLess(peak, out.nbytes / 10)
+
+    def test_mismatched_workspace(self):
+        with self.assertRaises(ValueError):
+            stokes(self.ID, n=[1, 3], workspace=StokesWorkspace((3,)))
+        with self.assertRaises(ValueError):
+            stokes(self.ID, n=[1, 3], workspace=StokesWorkspace((2,)),
+                    dtype=np.float32)
+
+    def test_bad_harmonics(self):
+        with self.assertRaises(ValueError):
+            stokes(self.ID, n=51)
+
+    def test_bad_mode(self):
+        with self.assertRaises(ValueError):
+            stokes(self.ID, Kx=1.0, Ky=1.0, mode='helical')
+
+
+class TestInclinedMode(unittest.TestCase):
+
+    def setUp(self):
+        insdev = {'period': 56e-3, 'Kmax': 3.6, 'Np': 46, 'L': 56e-3*46}
+        beam = {
+            'energy': 1.5e9,
+            'betax': 6,
+            'betay': 3,
+            'emitx': 6e-9,
+            'emity': 60e-12,
+            'espread': 0.7e-3
+        }
+        self.ID = Undulator(insdev=insdev, beam=beam)
+        self.flux = 1.7443e14 * 1.5**2 * 46**2
+
+    def test_rotated_planar_device(self):
+        '''
+        Inclined mode is a planar device with K = hypot(Kx, Ky), rotated
+        by psi = atan2(Ky, Kx)
+        '''
+        n = np.arange(1, 12, 2)[:, None]
+        psi = np.linspace(-np.pi/2, np.pi/2, 9)
+        Kx, Ky = 2.5 * np.cos(psi), 2.5 * np.sin(psi)
+        S = stokes(self.ID, n, Kx, Ky, mode='inclined')
+        planar = stokes(self.ID, n, Kx=2.5)[0]
+        np.testing.assert_allclose(S[0], np.broadcast_to(planar, S[0].shape))
+        np.testing.assert_allclose(S[1], S[0] * np.cos(2*psi),
+                atol=1e-12*S[0].max())
+        np.testing.assert_allclose(S[2], S[0] * np.sin(2*psi),
+                atol=1e-12*S[0].max())
+        np.testing.assert_array_equal(S[3], 0)
+
+    def test_diagonal_polarization(self):
+        S = stokes(self.ID, n=[1, 3, 5], Kx=1.5, Ky=[[1.5], [-1.5]],
+                mode='inclined')
+        self.assertTrue(np.all(S[2, 0] > 0))
+        self.assertTrue(np.all(S[2, 1] < 0))
+        F = polarized_flux(S)
+        np.testing.assert_allclose(F[POLARIZATIONS.index('diagonal'), 0],
+                S[0, 0])
+        np.testing.assert_allclose(F[POLARIZATIONS.index('antidiagonal'), 1],
+                S[0, 1])
+
+    @given(n=integers(min_value=1, max_value=49).map(lambda n: n | 1),
+            Kx=floats(min_value=0, max_value=5),
+            Ky=floats(min_value=-5, max_value=5))
+    def test_inclined_fully_polarized(self, n, Kx, Ky):
+        S = stokes(self.ID, n, Kx, Ky, mode='inclined')
+        self.assertAlmostEqual(
+                (S[1]**2 + S[2]**2 + S[3]**2)**0.5 / self.flux,
+                S[0] / self.flux)
+
+    def test_inclined_energy_grid(self):
+        energy = np.linspace(100, 3000, 7)[:, None]
+        S = stokes(self.ID, [1, 3, 5], 1.0, 0.7, energy, mode='inclined')
+        np.testing.assert_array_equal(S[3], 0)
+        np.testing.assert_allclose(S[1]**2 + S[2]**2, S[0]**2)
+
+
+class TestPolarizedFlux(unittest.TestCase):
+
+    def setUp(self):
+        insdev = {'period': 56e-3, 'Kmax': 3.6, 'Np': 46, 'L': 56e-3*46}
+        beam = {
+            'energy': 1.5e9,
+            'betax': 6,
+            'betay': 3,
+            'emitx': 6e-9,
+            'emity': 60e-12,
+            'espread': 0.7e-3
+        }
+        self.ID = Undulator(insdev=insdev, beam=beam)
+
+    def test_pure_states(self):
+        '''
+        Planar and helical devices put all their flux in one state
+        '''
+        S = stokes(self.ID, n=1, Kx=[1.5, 0, 1.5, 1.5], Ky=[0, 1.5, 1.5, -1.5])
+        F = polarized_flux(S)
+        self.assertEqual(F.shape, (len(POLARIZATIONS), 4))
+        for column, state in enumerate(
+                ('horizontal', 'vertical', 'positive', 'negative')):
+            # Each pair of orthogonal states shares S0, evenly unless it
+            # contains the pure state
+            index = POLARIZATIONS.index(state)
+            expected_value = np.full(len(POLARIZATIONS), S[0, column] / 2)
+            expected_value[index ^ 1] = 0
+            expected_value[index] = S[0, column]
+            np.testing.assert_allclose(F[:, column], expected_value,
+                    atol=1e-9*S[0, column])
+
+    def test_pairs_sum_to_total(self):
+        n = np.arange(1, 10, 2)[:, None]
+        S = stokes(self.ID, n, Kx=2.0, Ky=np.linspace(-2, 2, 5))
+        out = np.empty((6, 5, 5))
+        F = polarized_flux(S, out=out)
+        self.assertIs(F, out)
+        for k in range(3):
+            np.testing.assert_allclose(F[2*k] + F[2*k+1], S[0])
+
+    def test_bad_shape(self):
+        with self.assertRaises(ValueError):
+            polarized_flux(np.zeros((3, 2)))
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+'''
+Analytic calculations of undulator radiation.
+
+Importing the package loads only the scalar core (*Undulator* and the
+*ebeam* and *utilities* helpers), which depends on nothing outside the
+standard library.  Subsystems that need heavier dependencies are listed
+in *_lazy_submodules* and *_lazy_attrs* and are only imported the first
+time one of their names is accessed on the package.
+'''
+from importlib import import_module
+from typing import Dict, List
+
+from undulator.undulator import Undulator
+
+__all__ = ['Undulator']
+
+# Submodules needing numpy, imported on first access
+_lazy_submodules = ('grid', 'polarization')
+
+# Public name -> submodule that provides it, imported on first access
+_lazy_attrs = {
+        'BrightnessWorkspace': 'undulator.grid',
+        'stokes': 'undulator.polarization',
+        'StokesWorkspace': 'undulator.polarization',
+        'polarized_flux': 'undulator.polarization',
+        }  # type: Dict[str, str]
+
+
+def __getattr__(name: str):
+    if name in _lazy_submodules:
+        return import_module('undulator.' + name)
+    if name in _lazy_attrs:
+        value = getattr(import_module(_lazy_attrs[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module 'undulator' has no attribute " + repr(name))
+
+
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + list(_lazy_submodules) + list(_lazy_attrs))
@@ -0,0 +1,109 @@
+'''
+Argument handling shared by the numpy-based modules (*grid* and
+*polarization*).
+'''
+from typing import List, Tuple
+
+import numpy as np
+
+Shape = Tuple[int, ...]
+
+
+class Workspace:
+    '''
+    Base class for the preallocated intermediate arrays of a calculation.
+
+    Subclasses allocate their arrays in __init__ with *empty*.
+
+    Args:
+        shape: The broadcast shape of the grid being evaluated.
+        dtype: The floating point type of the calculation.
+    '''
+    def __init__(self, shape: Shape, dtype=np.float64) -> None:
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def empty(self) -> np.ndarray:
+        return np.empty(self.shape, self.dtype)
+
+    def __repr__(self) -> str:
+        return (type(self).__name__ + '(' + repr(self.shape) + ', ' +
+                repr(self.dtype) + ')')
+
+
+def check_dtype(dtype) -> np.dtype:
+    '''
+    Check that a calculation dtype is float32 or float64
+
+    Examples
+    --------
+    >>> check_dtype('float32')
+    dtype('float32')
+    '''
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError("'dtype' must be float32 or float64")
+    return dtype
+
+
+def check_harmonics(n) -> None:
+    '''
+    Check that all harmonic numbers are between 1 and 50
+    '''
+    n = np.asarray(n)
+    if np.any(n < 1):
+        raise ValueError('Harmonic numbers must be >=1')
+    if np.any(n > 50):
+        raise ValueError('Harmonics higher than 50 are likely to be' +
+                'non-physical')
+
+
+def check_positive(name: str, value, allow_zero: bool=False) -> None:
+    '''
+    Check that all values of a parameter are >0 (or >=0 if allow_zero)
+
+    Examples
+    --------
+    >>> check_positive('betax', [1.0, 0.0])
+    Traceback (most recent call last):
+        ...
+    ValueError: betax must be >0
+    '''
+    value = np.asarray(value)
+    if allow_zero:
+        if np.any(value < 0):
+            raise ValueError(name + ' must be >=0')
+    elif np.any(value <= 0):
+        raise ValueError(name + ' must be >0')
+
+
+def cast_inputs(dtype: np.dtype, *args) -> List[np.ndarray]:
+    '''
+    Convert parameter arrays to the calculation dtype
+
+    Casting the (small) parameter arrays once avoids numpy allocating
+    casting buffers inside every grid-sized operation.
+    '''
+    return [np.asarray(arg, dtype) for arg in args]
+
+
+def check_workspace(workspace: Workspace, shape: Shape,
+        dtype: np.dtype) -> Workspace:
+    '''
+    Return workspace after checking its shape and dtype
+    '''
+    if workspace.shape != shape or workspace.dtype != dtype:
+        raise ValueError('workspace does not match the grid shape and dtype')
+    return workspace
+
+
+def output_array(out, shape: Shape, dtype: np.dtype) -> np.ndarray:
+    '''
+    Return out after checking its shape and dtype, or a new array if None
+    '''
+    if out is None:
+        return np.empty(shape, dtype)
+    if out.shape != shape or out.dtype != dtype:
+        raise ValueError('out must have shape ' + repr(shape) +
+                ' and dtype ' + str(dtype))
+    return out
@@ -5,6 +5,7 @@ of undulator radiation.
 from undulator.ebeam import sig, sigp, beamgamma, m
 from undulator.utilities import wavelength2energy
 c = 299792458.0
+magic_num = 0.193065 # solve sinc(pi.N.x) = sqrt(1/exp(1))
 
 from collections import namedtuple
 from math import pi
@@ -96,7 +97,6 @@ class Undulator:
         return (disp_term**2 + energy_term**2)**0.5
 
     def spectralwidth_undulator(self, n: int=1, theta: float=0) -> float:
-        magic_num = 0.193065 # solve sinc(pi.N.x) = sqrt(1/exp(1))
         return magic_num * self.lamda_n(n, theta) / (n * self.insdev.Np)
 
     def spectralwidth_total(self, n: int=1, theta: float=0) -> float: